@@ -0,0 +1,282 @@
+import contextlib
+import io
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import tinyc
+
+tinyc.use_cache = False
+
+def variables(values: list[int]) -> dict[str, int]:
+    return {chr(ord("a") + i): v for i, v in enumerate(values) if v != 0}
+
+def execute(source: str, vm: bool) -> dict[str, int]:
+    tinyc.source = source
+    return variables(tinyc.execute(vm))
+
+def execute_unoptimized(source: str) -> dict[str, int]: # The VM without the peephole pass.
+    tinyc.source = source
+    tinyc.here = 0
+    tinyc.c(tinyc.program())
+    for i in range(26):
+        tinyc._globals[i] = 0
+    tinyc.run()
+    return variables(list(tinyc._globals))
+
+EXAMPLES = [
+    ("a=b=c=2<3;", {"a": 1, "b": 1, "c": 1}),
+    ("{ i=1; while (i<100) i=i+i; }", {"i": 128}),
+    ("{ i=125; j=100; while (i-j) if (i<j) j=j-i; else i=i-j; }", {"i": 25, "j": 25}),
+    ("{ i=1; do i=i+10; while (i<50); }", {"i": 51}),
+    ("{ i=1; while ((i=i+10)<50) ; }", {"i": 51}),
+    ("{ i=7; if (i<5) x=1; if (i<10) y=2; }", {"i": 7, "y": 2}),
+    # Jumps into and out of loops whose conditions and bodies are fused load+arithmetic pairs.
+    ("{ i=0; s=0; while (i<30) { i=i+1; if (i-(i-1)) s=s+i; else s=s-1; } do t=t+2; while (t<9); }",
+     {"i": 30, "s": 465, "t": 10}),
+    ("{ n=0; while (n<10) { j=0; while (j<n) { if (j<3) k=k+j; else k=k-1; j=j+1; } n=n+1; } }",
+     {"j": 9, "k": 1, "n": 10}),
+    ("{ a=5; if (a<10) { if (b<a) c=a-b; } else c=1; d=c+a-b; }", {"a": 5, "c": 5, "d": 10}),
+]
+
+def random_programs(count: int) -> list[str]: # Seeded, so every run checks the same programs.
+    rng = random.Random(0)
+
+    def expression(depth: int) -> str:
+        choice = rng.randrange(6 if depth > 0 else 2)
+        if choice == 0:
+            return str(rng.choice([0, 1, 2, 7, 100, 8388607, 8388608, 2147483647]))
+        if choice == 1:
+            return rng.choice("abcdefgh")
+        if choice == 2:
+            return f"{expression(depth - 1)}+{expression(depth - 1)}"
+        if choice == 3:
+            return f"{expression(depth - 1)}-({expression(depth - 1)})"
+        if choice == 4:
+            return f"({expression(depth - 1)}<{expression(depth - 1)})"
+        return f"({rng.choice('abcdefgh')}={expression(depth - 1)})"
+
+    def statement(depth: int, counters: str) -> str:
+        choice = rng.randrange(5 if depth > 0 and counters else 2)
+        if choice <= 1:
+            return f"{rng.choice('abcdefgh')}={expression(2)};"
+        if choice == 2:
+            return f"if ({expression(2)}) {statement(depth - 1, counters)} else {statement(depth - 1, counters)}"
+        body = " ".join(statement(depth - 1, counters[1:]) for _ in range(rng.randrange(1, 4)))
+        i = counters[0] # Loop counters are never assigned in the body, so every loop terminates.
+        if choice == 3:
+            return f"{{ {i}=0; while ({i}<{rng.randrange(1, 5)}) {{ {body} {i}={i}+1; }} }}"
+        return f"{{ {i}=0; do {{ {body} {i}={i}+1; }} while ({i}<{rng.randrange(1, 5)}); }}"
+
+    return ["{ " + " ".join(statement(3, "xyz") for _ in range(rng.randrange(1, 6))) + " }" for _ in range(count)]
+
+class LexerTest(unittest.TestCase):
+    def symbols(self, source: str) -> list[int]:
+        tinyc.source = source
+        tinyc.pos, tinyc.ch = 0, " "
+        symbols = []
+        while not symbols or symbols[-1] != tinyc.EOI:
+            tinyc.next_sym()
+            symbols.append(tinyc.sym)
+        return symbols
+
+    def test_keywords(self):
+        self.assertEqual(self.symbols("do else if while"),
+                         [tinyc.DO_SYM, tinyc.ELSE_SYM, tinyc.IF_SYM, tinyc.WHILE_SYM, tinyc.EOI])
+        self.assertEqual(self.symbols("{ x=12; }"),
+                         [tinyc.LBRA, tinyc.ID, tinyc.EQUAL, tinyc.INT, tinyc.SEMI, tinyc.RBRA, tinyc.EOI])
+        self.assertEqual(tinyc.int_val, 12)
+
+    def test_long_identifier(self): # Only the variables "a" to "z" exist.
+        for source in ("ab=1;", "{ a=1; iff (a<2) b=1; }"):
+            with self.subTest(source=source):
+                tinyc.source = source
+                with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+                    tinyc.program()
+
+class PeepholeProgramTest(unittest.TestCase): # The VM with and without peephole() must agree.
+    def check(self, source: str, expected: dict[str, int]) -> None:
+        self.assertEqual(execute(source, vm=True), expected)
+        self.assertEqual(execute_unoptimized(source), expected)
+
+    def test_examples(self):
+        for source, expected in EXAMPLES:
+            with self.subTest(source=source):
+                self.check(source, expected)
+
+    def test_random_programs(self):
+        for source in random_programs(200):
+            with self.subTest(source=source):
+                self.assertEqual(execute(source, vm=True), execute_unoptimized(source))
+
+class PeepholeTest(unittest.TestCase):
+    def test_jump_target_is_not_fused(self):
+        # JZ lands on the IADD of an IPUSH, IADD pair: fusing the pair would skip the addition of 7 and 2.
+        tinyc.here = 0
+        tinyc.g(tinyc.IPUSH, 7)
+        tinyc.g(tinyc.IPUSH, 2)
+        tinyc.g(tinyc.IPUSH, 0)
+        p = tinyc.hole(tinyc.JZ)
+        tinyc.g(tinyc.IPUSH, 1)
+        tinyc.fix(p, tinyc.here)
+        tinyc.g(tinyc.IADD)
+        tinyc.g(tinyc.ISTORE_POP, 0)
+        tinyc.g(tinyc.HALT)
+        tinyc.peephole()
+        self.assertEqual([w & 0xFF for w in tinyc._object[:tinyc.here]],
+                         [tinyc.IPUSH, tinyc.IPUSH, tinyc.IPUSH, tinyc.JZ, tinyc.IPUSH, tinyc.IADD, tinyc.ISTORE_POP,
+                          tinyc.HALT])
+        tinyc._globals[0] = 0
+        tinyc.run()
+        self.assertEqual(tinyc._globals[0], 9)
+
+    def test_jumps_are_remapped(self):
+        tinyc.source = "{ i=0; while (i<5) { a=a+i; if (a<3) b=b+1; else b=b-1; i=i+1; } }"
+        tinyc.here = 0
+        tinyc.c(tinyc.program())
+        before = tinyc.here
+        tinyc.peephole()
+        self.assertLess(tinyc.here, before)
+        for i in range(26):
+            tinyc._globals[i] = 0
+        tinyc.run()
+        self.assertEqual(variables(list(tinyc._globals)), {"a": 10, "b": -1, "i": 5})
+
+class WrapTest(unittest.TestCase): # Integers are 32-bit and wrap around on overflow.
+    def test_wrap(self):
+        self.assertEqual(tinyc.wrap(2147483647), 2147483647)
+        self.assertEqual(tinyc.wrap(2147483648), -2147483648)
+        self.assertEqual(tinyc.wrap(-2147483649), 2147483647)
+        self.assertEqual(tinyc.wrap(4294967297), 1)
+
+    def test_vm_arithmetic_wraps(self):
+        self.assertEqual(execute("{ a=2147483647; b=a+1; c=0-b-1; d=4294967297; }", vm=True),
+                         {"a": 2147483647, "b": -2147483648, "c": 2147483647, "d": 1})
+        self.assertEqual(execute("{ i=1; while (0<i) i=i+i; }", vm=True), {"i": -2147483648})
+        self.assertEqual(execute("{ i=1; j=0; while (j<40) { i=i+i; j=j+1; } }", vm=True), {"j": 40})
+
+class WordCodeTest(unittest.TestCase):
+    def test_wide_constants(self): # Constants outside the 24-bit operand range are emitted as IPUSH_WIDE.
+        source = "{ a=8388608; b=1+8388607; c=0-8388609; d=8388607; while (d<8388609) d=d+1; }"
+        expected = {"a": 8388608, "b": 8388608, "c": -8388609, "d": 8388609}
+        self.assertEqual(execute(source, vm=True), expected)
+        self.assertEqual(execute_unoptimized(source), expected)
+        self.assertIn(tinyc.IPUSH_WIDE, [w & 0xFF for w in tinyc._object[:tinyc.here]])
+
+    def test_long_jumps(self): # Loop bodies longer than the old 8-bit jump offsets.
+        self.assertEqual(execute("{ i=0; while (i<3) { " + "a=a+1; " * 200 + "i=i+1; } }", vm=True),
+                         {"a": 600, "i": 3})
+
+class FoldTest(unittest.TestCase):
+    def folded(self, source: str) -> int: # The folded statement of a program.
+        tinyc.source = source
+        return tinyc.O1[tinyc.program()]
+
+    def test_constant_expressions(self):
+        x = self.folded("a=(2+3)-(1+1)<4;")
+        self.assertEqual(tinyc.KIND[x], tinyc.EXPR)
+        self.assertEqual(tinyc.KIND[tinyc.O2[tinyc.O1[x]]], tinyc.CST)
+        self.assertEqual(tinyc.VAL[tinyc.O2[tinyc.O1[x]]], 1)
+        self.assertEqual(tinyc.VAL[tinyc.O2[tinyc.O1[self.folded("a=b-b;")]]], 0)
+
+    def test_dead_statements(self):
+        self.assertEqual(tinyc.KIND[self.folded("{ if (0) a=1; while (0) b=1; 5; c; ; }")], tinyc.EMPTY)
+        x = self.folded("if (1<2) a=1; else b=2;")
+        self.assertEqual(tinyc.VAL[tinyc.O1[tinyc.O1[x]]], 0)
+
+    def test_programs(self):
+        source = "{ a=3+4; b=a-a; c=1<2; if (0) d=5; else e=6; if (1) f=7; while (0) g=1; h=(2+3)-(1+1); 5; ; }"
+        self.assertEqual(execute(source, vm=True), {"a": 7, "c": 1, "e": 6, "f": 7, "h": 3})
+
+    def test_no_recursion_limit(self): # Long blocks and long sums are folded without one stack frame per element.
+        self.assertEqual(execute("{ " + "a=a+1; " * 3000 + "}", vm=True), {"a": 3000})
+        self.assertEqual(execute("{ b=1; a=1" + "+b" * 3000 + "-2; }", vm=True), {"a": 2999, "b": 1})
+        self.assertEqual(execute("a=1" + "+2" * 3000 + ";", vm=True), {"a": 6001})
+
+class PythonBackendTest(unittest.TestCase): # The Python backend must agree with the VM.
+    def test_examples(self):
+        for source, expected in EXAMPLES:
+            with self.subTest(source=source):
+                tinyc.source = source
+                self.assertIsNotNone(tinyc.compile_py())
+                self.assertEqual(execute(source, vm=False), expected)
+
+    def test_random_programs(self):
+        for source in random_programs(200):
+            with self.subTest(source=source):
+                self.assertEqual(execute(source, vm=False), execute(source, vm=True))
+
+    def test_arithmetic_wraps(self):
+        self.assertEqual(execute("{ a=2147483647; b=a+1; c=0-b-1; d=4294967297; }", vm=False),
+                         {"a": 2147483647, "b": -2147483648, "c": 2147483647, "d": 1})
+        self.assertEqual(execute("{ i=1; while (0<i) i=i+i; }", vm=False), {"i": -2147483648})
+        self.assertEqual(execute("{ i=1; j=0; while (j<40) { i=i+i; j=j+1; } }", vm=False), {"j": 40})
+
+    def test_beyond_python_compiler_limits(self): # Programs CPython cannot compile run on the VM instead.
+        source = "{ b=1; a=0" + "+b" * 249 + "; }"
+        self.assertEqual(execute(source, vm=False), {"a": 249, "b": 1})
+        source = "{ " + "while (i<1) { i=i+1; " * 25 + "a=1;" + " }" * 25 + " }"
+        tinyc.source = source
+        self.assertIsNone(tinyc.compile_py())
+        self.assertEqual(execute(source, vm=False), {"i": 1})
+        source = "{ " + "if (1<a) " * 120 + "b=1; a=3; }"
+        tinyc.source = source
+        self.assertIsNone(tinyc.compile_py())
+        self.assertEqual(execute(source, vm=False), {"a": 3})
+
+class CacheTest(unittest.TestCase):
+    SOURCE = "{ i=1; while (i<100) i=i+i; }"
+    EXPECTED = {"i": 128}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(setattr, tinyc, "CACHE_DIR", tinyc.CACHE_DIR)
+        self.addCleanup(setattr, tinyc, "use_cache", tinyc.use_cache)
+        tinyc.CACHE_DIR = directory.name
+        tinyc.use_cache = True
+
+    def test_hit(self): # The second run loads the compiled program instead of parsing the source again.
+        for vm in (True, False):
+            with self.subTest(vm=vm):
+                self.assertEqual(execute(self.SOURCE, vm), self.EXPECTED)
+                with mock.patch.object(tinyc, "program", side_effect=AssertionError):
+                    self.assertEqual(execute(self.SOURCE, vm), self.EXPECTED)
+
+    def test_bad_file_is_a_miss(self):
+        for backend in ("vm", "py"):
+            vm = backend == "vm"
+            execute(self.SOURCE, vm)
+            tinyc.source = self.SOURCE
+            path = tinyc.cache_path(backend)
+            with open(path, "rb") as f:
+                data = f.read()
+            for junk in (data[:len(data) // 2], b"garbage", b""):
+                with self.subTest(backend=backend, junk=junk):
+                    with open(path, "wb") as f:
+                        f.write(junk)
+                    self.assertEqual(execute(self.SOURCE, vm), self.EXPECTED)
+                    with open(path, "rb") as f: # The miss rewrites the entry.
+                        self.assertEqual(f.read(), data)
+
+    def test_disabled(self):
+        tinyc.use_cache = False
+        for vm in (True, False):
+            self.assertEqual(execute(self.SOURCE, vm), self.EXPECTED)
+        self.assertEqual(os.listdir(tinyc.CACHE_DIR), [])
+        # Store the object code of another program under this source's key: only a run that reads the cache sees it.
+        tinyc.use_cache = True
+        execute("i=5;", vm=True)
+        with open(tinyc.cache_path("vm"), "rb") as f:
+            data = f.read()
+        tinyc.source = self.SOURCE
+        with open(tinyc.cache_path("vm"), "wb") as f:
+            f.write(data)
+        self.assertEqual(execute(self.SOURCE, vm=True), {"i": 5})
+        tinyc.use_cache = False
+        self.assertEqual(execute(self.SOURCE, vm=True), self.EXPECTED)
+
+if __name__ == "__main__":
+    unittest.main()
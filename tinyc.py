@@ -1,11 +1,17 @@
 import array
+import hashlib
+import marshal
+import os
 import sys
-from enum import Enum, EnumMeta
+from enum import Enum
+from types import CodeType
 from typing import Optional
 
-class CustomEnumMeta(EnumMeta):
-    def __getitem__(self, index):
-        return list(self)[index].name
+try:
+    from numba import njit
+except ImportError: # Numba is optional, without it the VM runs as plain Python.
+    def njit(*args, **kwargs):
+        return lambda f: f
 
 """
 This is a compiler for the Tiny-C language. Tiny-C is a considerably stripped down version of C and it is meant as a
@@ -73,8 +79,21 @@ class Symbol(Enum):
     ID = 14
     EOI = 15
 
-words: list[Optional[str]] = ["do", "else", "if", "while", None]
-
+# The enum values are also bound to plain module-level ints, so the lexer, parser, code generator and VM compare ints
+# instead of going through enum attribute lookups.
+(DO_SYM, ELSE_SYM, IF_SYM, WHILE_SYM, LBRA, RBRA, LPAR, RPAR, PLUS, MINUS, LESS, SEMI, EQUAL, INT, ID,
+ EOI) = (s.value for s in Symbol)
+PLUS_MINUS = frozenset((PLUS, MINUS))
+
+keywords: dict[str, int] = {
+    "do": DO_SYM,
+    "else": ELSE_SYM,
+    "if": IF_SYM,
+    "while": WHILE_SYM,
+}
+
+source: str = "" # The whole program, read from standard input in one go.
+pos: int = 0
 ch: str = " "
 sym: int
 int_val: int
@@ -84,11 +103,14 @@ def syntax_error() -> None:
     print("syntax error", file=sys.stderr)
     sys.exit(1)
 
+# Tiny-C integers are 32-bit and wrap around on overflow, as C ints do on two's complement machines.
+def wrap(val: int) -> int:
+    return ((val + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
 def next_ch() -> None:
-    global ch
-    ch = sys.stdin.read(1)
-    if ch == "":
-        ch = "EOF"
+    global ch, pos
+    ch = source[pos] if pos < len(source) else "EOF"
+    pos += 1 # Keeps source[pos - 1] the position of ch, even at the end of the input.
 
 def next_sym() -> None:
     global sym, int_val, id_name, ch
@@ -97,64 +119,58 @@ def next_sym() -> None:
             next_ch()
             return next_sym()
         case "EOF":
-            sym = Symbol.EOI.value
+            sym = EOI
             return
         case "{":
             next_ch()
-            sym = Symbol.LBRA.value
+            sym = LBRA
             return
         case "}":
             next_ch()
-            sym = Symbol.RBRA.value
+            sym = RBRA
             return
         case "(":
             next_ch()
-            sym = Symbol.LPAR.value
+            sym = LPAR
             return
         case ")":
             next_ch()
-            sym = Symbol.RPAR.value
+            sym = RPAR
             return
         case "+":
             next_ch()
-            sym = Symbol.PLUS.value
+            sym = PLUS
             return
         case "-":
             next_ch()
-            sym = Symbol.MINUS.value
+            sym = MINUS
             return
         case "<":
             next_ch()
-            sym = Symbol.LESS.value
+            sym = LESS
             return
         case ";":
             next_ch()
-            sym = Symbol.SEMI.value
+            sym = SEMI
             return
         case "=":
             next_ch()
-            sym = Symbol.EQUAL.value
+            sym = EQUAL
             return
         case _:
-            if ch >= "0" and ch <= "9":
-                int_val = 0
-                while ch >= "0" and ch <= "9":
-                    int_val = int_val * 10 + ord(ch) - ord("0")
+            start = pos - 1
+            if "0" <= ch <= "9":
+                while "0" <= ch <= "9":
                     next_ch()
-                sym = Symbol.INT.value
-            elif ch >= "a" and ch <= "z":
-                id_name = ""
-                while (ch >= "a" and ch <= "z") or (ch == "_"):
-                    id_name += ch
+                int_val = int(source[start:pos - 1])
+                sym = INT
+            elif "a" <= ch <= "z":
+                while "a" <= ch <= "z" or ch == "_":
                     next_ch()
-                sym = 0
-                while words[sym] != None and words[sym] != id_name:
-                    sym += 1
-                if words[sym] == None:
-                    if len(id_name) == 1:
-                        sym = Symbol.ID.value
-                    else:
-                        syntax_error()
+                id_name = source[start:pos - 1]
+                sym = keywords.get(id_name, ID)
+                if sym == ID and len(id_name) != 1: # Only the variables "a" to "z" exist.
+                    syntax_error()
             else:
                 syntax_error()
 
@@ -162,7 +178,7 @@ def next_sym() -> None:
 
 # Parser. #
 
-class NodeType(Enum, metaclass=CustomEnumMeta):
+class NodeType(Enum):
     VAR = 0
     CST = 1
     ADD = 2
@@ -178,138 +194,220 @@ class NodeType(Enum, metaclass=CustomEnumMeta):
     EXPR = 12
     PROG = 13
 
-class Node:
-    def __init__(self, kind: int):
-        self.kind: int = kind
-        self.o1: Node
-        self.o2: Node
-        self.o3: Node
-        self.val: int
-
-def new_node(k: int) -> Node:
-    return Node(k)
-
-def paren_expr() -> Node: # <paren_expr> ::= "(" <expr> ")"
-    if sym == Symbol.LPAR.value:
+VAR, CST, ADD, SUB, LT, SET, IF1, IF2, WHILE, DO, EMPTY, SEQ, EXPR, PROG = (n.value for n in NodeType)
+
+# The AST is stored column-wise: a node is an index into these parallel arrays, and o1/o2/o3 hold child node indices.
+KIND: array.array = array.array("b")
+O1: list[int] = []
+O2: list[int] = []
+O3: list[int] = []
+VAL: array.array = array.array("i")
+
+def new_node(k: int) -> int:
+    KIND.append(k)
+    O1.append(0)
+    O2.append(0)
+    O3.append(0)
+    VAL.append(0)
+    return len(KIND) - 1
+
+def paren_expr() -> int: # <paren_expr> ::= "(" <expr> ")"
+    if sym == LPAR:
         next_sym()
     else:
         syntax_error()
     x = expr()
-    if sym == Symbol.RPAR.value:
+    if sym == RPAR:
         next_sym()
     else:
         syntax_error()
     return x
 
-def term() -> Node: # <term> ::= <id> | <int> | <paren_expr>
+def term() -> int: # <term> ::= <id> | <int> | <paren_expr>
     global id_name
-    if sym == Symbol.ID.value:
-        x = new_node(NodeType.VAR.value)
-        x.val = ord(id_name[0]) - ord("a")
+    if sym == ID:
+        x = new_node(VAR)
+        VAL[x] = ord(id_name[0]) - ord("a")
         next_sym()
-    elif sym == Symbol.INT.value:
-        x = new_node(NodeType.CST.value)
-        x.val = int_val
+    elif sym == INT:
+        x = new_node(CST)
+        VAL[x] = wrap(int_val)
         next_sym()
     else:
         x = paren_expr()
     return x
 
-def _sum() -> Node: # <sum> ::= <term> | <sum> "+" <term> | <sum> "-" <term>
+def _sum() -> int: # <sum> ::= <term> | <sum> "+" <term> | <sum> "-" <term>
     x = term()
-    while sym in [Symbol.PLUS.value, Symbol.MINUS.value]:
+    while sym in PLUS_MINUS:
         t = x
-        x = new_node(NodeType.ADD.value if sym == Symbol.PLUS.value else NodeType.SUB.value)
+        x = new_node(ADD if sym == PLUS else SUB)
         next_sym()
-        x.o1 = t
-        x.o2 = term()
+        O1[x] = t
+        O2[x] = term()
     return x
 
-def test() -> Node: # <test> ::= <sum> | <sum> "<" <sum>
+def test() -> int: # <test> ::= <sum> | <sum> "<" <sum>
     x = _sum()
-    if sym == Symbol.LESS.value:
+    if sym == LESS:
         t = x
-        x = new_node(NodeType.LT.value)
+        x = new_node(LT)
         next_sym()
-        x.o1 = t
-        x.o2 = _sum()
+        O1[x] = t
+        O2[x] = _sum()
     return x
 
-def expr() -> Node: # <expr> ::= <test> | <id> "=" <expr>
-    if sym != Symbol.ID.value:
+def expr() -> int: # <expr> ::= <test> | <id> "=" <expr>
+    if sym != ID:
         return test()
     x = test()
-    if x.kind == NodeType.VAR.value and sym == Symbol.EQUAL.value:
+    if KIND[x] == VAR and sym == EQUAL:
         t = x
-        x = new_node(NodeType.SET.value)
+        x = new_node(SET)
         next_sym()
-        x.o1 = t
-        x.o2 = expr()
+        O1[x] = t
+        O2[x] = expr()
     return x
 
-def statement() -> Node:
-    if sym == Symbol.IF_SYM.value: # "if" <paren_expr> <statement>
-        x = new_node(NodeType.IF1.value)
+def statement() -> int:
+    if sym == IF_SYM: # "if" <paren_expr> <statement>
+        x = new_node(IF1)
         next_sym()
-        x.o1 = paren_expr()
-        x.o2 = statement()
-        if sym == Symbol.ELSE_SYM.value: # ... "else" <statement>
-            x.kind = NodeType.IF2.value
+        O1[x] = paren_expr()
+        O2[x] = statement()
+        if sym == ELSE_SYM: # ... "else" <statement>
+            KIND[x] = IF2
             next_sym()
-            x.o3 = statement()
-    elif sym == Symbol.WHILE_SYM.value: # "while" <paren_expr> <statement>
-        x = new_node(NodeType.WHILE.value)
+            O3[x] = statement()
+    elif sym == WHILE_SYM: # "while" <paren_expr> <statement>
+        x = new_node(WHILE)
         next_sym()
-        x.o1 = paren_expr()
-        x.o2 = statement()
-    elif sym == Symbol.DO_SYM.value: # "do" <statement> "while" <paren_expr> ";"
-        x = new_node(NodeType.DO.value)
+        O1[x] = paren_expr()
+        O2[x] = statement()
+    elif sym == DO_SYM: # "do" <statement> "while" <paren_expr> ";"
+        x = new_node(DO)
         next_sym()
-        x.o1 = statement()
-        if sym == Symbol.WHILE_SYM.value:
+        O1[x] = statement()
+        if sym == WHILE_SYM:
             next_sym()
         else:
             syntax_error()
-        x.o2 = paren_expr()
-        if sym == Symbol.SEMI.value:
+        O2[x] = paren_expr()
+        if sym == SEMI:
             next_sym()
         else:
             syntax_error()
-    elif sym == Symbol.SEMI.value: # ";"
-        x = new_node(NodeType.EMPTY.value)
+    elif sym == SEMI: # ";"
+        x = new_node(EMPTY)
         next_sym()
-    elif sym == Symbol.LBRA.value: # "{" { <statement> } "}"
-        x = new_node(NodeType.EMPTY.value)
+    elif sym == LBRA: # "{" { <statement> } "}"
+        x = new_node(EMPTY)
         next_sym()
-        while sym != Symbol.RBRA.value:
+        while sym != RBRA:
             t = x
-            x = new_node(NodeType.SEQ.value)
-            x.o1 = t
-            x.o2 = statement()
+            x = new_node(SEQ)
+            O1[x] = t
+            O2[x] = statement()
         next_sym()
     else: # <expr> ";"
-        x = new_node(NodeType.EXPR.value)
-        x.o1 = expr()
-        if sym == Symbol.SEMI.value:
+        x = new_node(EXPR)
+        O1[x] = expr()
+        if sym == SEMI:
             next_sym()
         else:
             syntax_error()
     return x
 
-def program() -> Node: # <program> ::= <statement>
-    global sym
-    x = new_node(NodeType.PROG.value)
+def program() -> int: # <program> ::= <statement>
+    global sym, pos, ch
+    pos, ch = 0, " " # Parse from the start of source, also when a second backend parses it again.
+    x = new_node(PROG)
     next_sym()
-    x.o1 = statement()
-    if sym != Symbol.EOI.value:
+    O1[x] = statement()
+    if sym != EOI:
         syntax_error()
+    O1[x] = fold(O1[x])
+    return x
+
+# ---------------------------------------------------------------------------#
+
+# Optimizer. #
+
+def constant(val: int) -> int:
+    x = new_node(CST)
+    VAL[x] = val
+    return x
+
+def fold_binary(x: int, a: int, b: int) -> int: # Folds the ADD, SUB or LT node x given its folded operands.
+    k = KIND[x]
+    O1[x] = a
+    O2[x] = b
+    if KIND[a] == CST and KIND[b] == CST:
+        if k == ADD:
+            return constant(wrap(VAL[a] + VAL[b]))
+        if k == SUB:
+            return constant(wrap(VAL[a] - VAL[b]))
+        return constant(int(VAL[a] < VAL[b]))
+    if k != ADD and KIND[a] == VAR and KIND[b] == VAR and VAL[a] == VAL[b]: # "v-v" and "v<v"
+        return constant(0)
+    return x
+
+def fold(x: int) -> int: # Folds constant expressions and drops statements that can never run or have no effect.
+    k = KIND[x]
+    if k in (ADD, SUB): # Sums are left-nested chains, walk them without recursing once per term.
+        chain = []
+        while KIND[x] in (ADD, SUB):
+            chain.append(x)
+            x = O1[x]
+        x = fold(x)
+        for t in reversed(chain):
+            x = fold_binary(t, x, fold(O2[t]))
+    elif k == LT:
+        x = fold_binary(x, fold(O1[x]), fold(O2[x]))
+    elif k == SET:
+        O2[x] = fold(O2[x])
+    elif k == IF1:
+        O1[x] = fold(O1[x])
+        O2[x] = fold(O2[x])
+        if KIND[O1[x]] == CST:
+            return O2[x] if VAL[O1[x]] != 0 else new_node(EMPTY)
+    elif k == IF2:
+        O1[x] = fold(O1[x])
+        O2[x] = fold(O2[x])
+        O3[x] = fold(O3[x])
+        if KIND[O1[x]] == CST:
+            return O2[x] if VAL[O1[x]] != 0 else O3[x]
+    elif k == WHILE:
+        O1[x] = fold(O1[x])
+        O2[x] = fold(O2[x])
+        if KIND[O1[x]] == CST and VAL[O1[x]] == 0:
+            return new_node(EMPTY)
+    elif k == DO:
+        O1[x] = fold(O1[x])
+        O2[x] = fold(O2[x])
+    elif k == SEQ: # Blocks are left-nested SEQ nodes, walk them without recursing once per statement.
+        seqs = []
+        while KIND[x] == SEQ:
+            seqs.append(x)
+            x = O1[x]
+        x = fold(x)
+        for seq in reversed(seqs):
+            O1[seq] = x
+            O2[seq] = fold(O2[seq])
+            if KIND[O2[seq]] == EMPTY:
+                continue
+            x = O2[seq] if KIND[x] == EMPTY else seq
+    elif k == EXPR:
+        O1[x] = fold(O1[x])
+        if KIND[O1[x]] in (VAR, CST):
+            return new_node(EMPTY)
     return x
 
 # ---------------------------------------------------------------------------#
 
 # Code generator #
 
-class Instruction(Enum, metaclass=CustomEnumMeta):
+class Instruction(Enum):
     IFETCH = 0
     ISTORE = 1
     IPUSH = 2
@@ -321,89 +419,227 @@ class Instruction(Enum, metaclass=CustomEnumMeta):
     JNZ = 8
     JMP = 9
     HALT = 10
-
-_object: array.array = array.array("b", [0] * 1000)
+    ISTORE_POP = 11
+    IFETCH_ADD = 12
+    IFETCH_SUB = 13
+    IFETCH_LT = 14
+    IPUSH_ADD = 15
+    IPUSH_SUB = 16
+    IPUSH_LT = 17
+    IPUSH_WIDE = 18
+
+(IFETCH, ISTORE, IPUSH, IPOP, IADD, ISUB, ILT, JZ, JNZ, JMP, HALT, ISTORE_POP,
+ IFETCH_ADD, IFETCH_SUB, IFETCH_LT, IPUSH_ADD, IPUSH_SUB, IPUSH_LT, IPUSH_WIDE) = (i.value for i in Instruction)
+
+# Each instruction is one 32-bit word: the opcode in the low byte and its operand (a variable index, a constant or a
+# relative jump offset) in the upper 24 bits. Constants that do not fit use IPUSH_WIDE, followed by a word holding the
+# full value. This is why the code is not kept in a bytearray: a byte per slot would bring back the 8-bit limit on
+# constants and jump offsets, and array.array already exposes its buffer to Numba without copying.
+_object: array.array = array.array("i")
 here: int = 0
 
-def g(c: int) -> None:
+def put(word: int) -> None:
     global here
-    _object[here] = c
+    if here < len(_object):
+        _object[here] = word
+    else:
+        _object.append(word)
     here += 1
 
-def hole() -> int:
-    global here
-    here += 1
+def g(op: int, operand: int = 0) -> None:
+    put(operand << 8 | op)
+
+def hole(op: int) -> int:
+    g(op)
     return here - 1
 
 def fix(src: int, dst: int) -> None:
-    _object[src] = dst - src
-
-def c(x: Node) -> None:
-    match NodeType[x.kind]:
-        case NodeType.VAR.name:
-            g(Instruction.IFETCH.value)
-            g(x.val)
-        case NodeType.CST.name:
-            g(Instruction.IPUSH.value)
-            g(x.val)
-        case NodeType.ADD.name:
-            c(x.o1)
-            c(x.o2)
-            g(Instruction.IADD.value)
-        case NodeType.SUB.name:
-            c(x.o1)
-            c(x.o2)
-            g(Instruction.ISUB.value)
-        case NodeType.LT.name:
-            c(x.o1)
-            c(x.o2)
-            g(Instruction.ILT.value)
-        case NodeType.SET.name:
-            c(x.o2)
-            g(Instruction.ISTORE.value)
-            g(x.o1.val)
-        case NodeType.IF1.name:
-            c(x.o1)
-            g(Instruction.JZ.value)
-            p1 = hole()
-            c(x.o2)
-            fix(p1, here)
-        case NodeType.IF2.name:
-            c(x.o1)
-            g(Instruction.JZ.value)
-            p1 = hole()
-            c(x.o2)
-            g(Instruction.JMP.value)
-            p2 = hole()
-            fix(p1, here)
-            c(x.o3)
-            fix(p2, here)
-        case NodeType.WHILE.name:
-            p1 = here
-            c(x.o1)
-            g(Instruction.JZ.value)
-            p2 = hole()
-            c(x.o2)
-            g(Instruction.JMP.value)
-            fix(hole(), p1)
-            fix(p2, here)
-        case NodeType.DO.name:
-            p1 = here
-            c(x.o1)
-            c(x.o2)
-            g(Instruction.JNZ.value)
-            fix(hole(), p1)
-        case NodeType.EMPTY.name:
-            pass
-        case NodeType.SEQ.name:
-            c(x.o1)
-            c(x.o2)
-        case NodeType.EXPR.name:
-            c(x.o1)
-            g(Instruction.IPOP.value)
-        case NodeType.PROG.name:
-            c(x.o1)
-            g(Instruction.HALT.value)
+    _object[src] = (dst - src) << 8 | _object[src] & 0xFF
+
+# The steps on the work list of c() are plain ints: a tag in the low 3 bits, and above it the node to visit (VISIT), the
+# instruction word to emit (EMIT) or the opcode of a forward jump (HOLE).
+VISIT, EMIT, HOLE, FIX, ELSE, END_WHILE, END_DO = range(7)
+EMIT_IADD, EMIT_ISUB, EMIT_ILT, EMIT_IPOP, EMIT_HALT = (op << 3 | EMIT for op in (IADD, ISUB, ILT, IPOP, HALT))
+HOLE_JZ = JZ << 3 | HOLE
+
+def c(x: int) -> None:
+    # The AST is walked with an explicit work list instead of recursion. Steps are popped in the order their code is
+    # emitted, so each node pushes the steps that follow its first child in reverse, then goes on with that child
+    # directly. Jump holes and loop starts wait on the labels stack until the jump can be fixed. The words are collected
+    # in a local list and copied to _object at the end; jump offsets are relative, so they do not depend on `here`.
+    global here
+    code: list[int] = []
+    emit = code.append
+    work = [x << 3 | VISIT]
+    labels: list[int] = []
+    while work:
+        step = work.pop()
+        tag = step & 7
+        if tag == VISIT:
+            x = step >> 3
+            while True:
+                k = KIND[x]
+                if k == VAR:
+                    emit(VAL[x] << 8 | IFETCH)
+                    break
+                elif k == CST:
+                    if -0x800000 <= VAL[x] < 0x800000:
+                        emit(VAL[x] << 8 | IPUSH)
+                    else:
+                        emit(IPUSH_WIDE)
+                        emit(VAL[x])
+                    break
+                elif k == ADD:
+                    work += (EMIT_IADD, O2[x] << 3)
+                    x = O1[x]
+                elif k == SUB:
+                    work += (EMIT_ISUB, O2[x] << 3)
+                    x = O1[x]
+                elif k == LT:
+                    work += (EMIT_ILT, O2[x] << 3)
+                    x = O1[x]
+                elif k == SET:
+                    work.append((VAL[O1[x]] << 8 | ISTORE) << 3 | EMIT)
+                    x = O2[x]
+                elif k == IF1:
+                    work += (FIX, O2[x] << 3, HOLE_JZ)
+                    x = O1[x]
+                elif k == IF2:
+                    work += (FIX, O3[x] << 3, ELSE, O2[x] << 3, HOLE_JZ)
+                    x = O1[x]
+                elif k == WHILE:
+                    labels.append(len(code))
+                    work += (END_WHILE, O2[x] << 3, HOLE_JZ)
+                    x = O1[x]
+                elif k == DO:
+                    labels.append(len(code))
+                    work += (END_DO, O2[x] << 3)
+                    x = O1[x]
+                elif k == EMPTY:
+                    break
+                elif k == SEQ:
+                    work.append(O2[x] << 3)
+                    x = O1[x]
+                elif k == EXPR:
+                    if KIND[O1[x]] == SET: # Store the value and drop it in one go.
+                        work.append((VAL[O1[O1[x]]] << 8 | ISTORE_POP) << 3 | EMIT)
+                        x = O2[O1[x]]
+                    else:
+                        work.append(EMIT_IPOP)
+                        x = O1[x]
+                else: # PROG
+                    work.append(EMIT_HALT)
+                    x = O1[x]
+        elif tag == EMIT:
+            emit(step >> 3)
+        elif tag == HOLE: # Forward jump, its offset is filled in by FIX, ELSE or END_WHILE.
+            labels.append(len(code))
+            emit(step >> 3)
+        elif tag == FIX: # The forward jump lands here.
+            p1 = labels.pop()
+            code[p1] |= len(code) - p1 << 8
+        elif tag == ELSE: # Jump over the else branch and land the condition jump on it.
+            p1 = labels.pop()
+            labels.append(len(code))
+            emit(JMP)
+            code[p1] |= len(code) - p1 << 8
+        elif tag == END_WHILE: # Jump back to the condition and land the exit jump after the loop.
+            p2 = labels.pop()
+            emit(labels.pop() - len(code) << 8 | JMP)
+            code[p2] |= len(code) - p2 << 8
+        else: # END_DO, jump back to the body while the condition holds.
+            emit(labels.pop() - len(code) << 8 | JNZ)
+    _object[here:] = array.array("i", code)
+    here += len(code)
+
+# Superinstructions: an operand load directly followed by an arithmetic instruction becomes one instruction.
+FUSED: dict[tuple[int, int], int] = {
+    (IFETCH, IADD): IFETCH_ADD,
+    (IFETCH, ISUB): IFETCH_SUB,
+    (IFETCH, ILT): IFETCH_LT,
+    (IPUSH, IADD): IPUSH_ADD,
+    (IPUSH, ISUB): IPUSH_SUB,
+    (IPUSH, ILT): IPUSH_LT,
+}
+
+def peephole() -> None:
+    global here
+    code = _object[:here]
+    jumps = []
+    pc = 0
+    while pc < len(code): # Skip the data word of IPUSH_WIDE, it is not an instruction.
+        if code[pc] & 0xFF in (JZ, JNZ, JMP):
+            jumps.append(pc)
+        pc += 2 if code[pc] & 0xFF == IPUSH_WIDE else 1
+    targets = {pc + (code[pc] >> 8) for pc in jumps}
+    pc_map = [0] * (here + 1)
+    pc, here = 0, 0
+    while pc < len(code):
+        pc_map[pc] = here
+        word = code[pc]
+        if word & 0xFF == IPUSH_WIDE:
+            put(word)
+            put(code[pc + 1])
+            pc += 2
+            continue
+        fused = None
+        if pc + 1 < len(code) and pc + 1 not in targets:
+            fused = FUSED.get((word & 0xFF, code[pc + 1] & 0xFF))
+        if fused is None:
+            put(word)
+            pc += 1
+        else:
+            g(fused, word >> 8)
+            pc += 2
+    pc_map[pc] = here
+    for pc in jumps:
+        fix(pc_map[pc], pc_map[pc + (code[pc] >> 8)])
+
+# --------------------------------------------------------------------------- #
+
+# Compiled code cache #
+
+CACHE_DIR: str = os.path.expanduser("~/.cache/tinyc")
+# Part of the cache key: a hash of the compiler itself and the Python version, so that any change to the compiler
+# invalidates old entries.
+with open(__file__, "rb") as f:
+    CACHE_VERSION: str = f"{hashlib.sha1(f.read()).hexdigest()}-{sys.implementation.cache_tag}"
+use_cache: bool = True
+
+def cache_path(backend: str) -> str:
+    return os.path.join(CACHE_DIR, hashlib.sha1((CACHE_VERSION + backend + source).encode()).hexdigest())
+
+def load_cache(backend: str) -> object:
+    if not use_cache:
+        return None
+    try:
+        with open(cache_path(backend), "rb") as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+def save_cache(backend: str, data: object) -> None:
+    if not use_cache:
+        return
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(cache_path(backend), "wb") as f:
+            marshal.dump(data, f)
+    except OSError: # The cache is only an optimization.
+        pass
+
+def compile_vm() -> None: # Fills _object with the object code of the program.
+    global here
+    data = load_cache("vm")
+    if isinstance(data, bytes) and len(data) % _object.itemsize == 0:
+        code = array.array("i", data)
+        _object[:len(code)] = code
+        here = len(code)
+    else:
+        here = 0
+        c(program())
+        peephole()
+        save_cache("vm", _object[:here].tobytes())
 
 # --------------------------------------------------------------------------- #
 
@@ -411,65 +647,179 @@ def c(x: Node) -> None:
 
 _globals = array.array("i", [0] * 26)
 
-def run() -> None:
-    global _globals, _object
-    stack, sp = array.array("i", [0] * 1000), 0
+# The VM loop only touches int arrays, so Numba (when installed) can compile it to native code.
+@njit(cache=True)
+def _run(obj, gvars, stack) -> None:
+    # The top of the stack is cached in `tos`, stack[sp - 1] is the element below it. Sums and differences are wrapped
+    # to 32 bits explicitly (see wrap()), so stores into the int32 arrays never overflow, with or without Numba.
+    sp = 0
+    tos = 0
     pc = 0
     while True:
-        instruction = Instruction[_object[pc]]
+        word = obj[pc]
+        op = word & 0xFF
+        arg = word >> 8
         pc += 1
-        match instruction:
-            case Instruction.IFETCH.name:
-                stack[sp] = _globals[_object[pc]]
-                sp += 1
-                pc += 1
-            case Instruction.ISTORE.name:
-                _globals[_object[pc]] = stack[sp - 1]
-                pc += 1
-            case Instruction.IPUSH.name:
-                stack[sp] = _object[pc]
-                sp += 1
-                pc += 1
-            case Instruction.IPOP.name:
-                sp -= 1
-            case Instruction.IADD.name:
-                stack[sp - 2] += stack[sp - 1]
-                sp -= 1
-            case Instruction.ISUB.name:
-                stack[sp - 2] -= stack[sp - 1]
-                sp -= 1
-            case Instruction.ILT.name:
-                stack[sp - 2] = int(stack[sp - 2] < stack[sp - 1])
-                sp -= 1
-            case Instruction.JZ.name:
-                sp -= 1
-                if stack[sp] == 0:
-                    pc += _object[pc]
-                else:
-                    pc += 1
-            case Instruction.JNZ.name:
-                sp -= 1
-                if stack[sp] != 0:
-                    pc += _object[pc]
-                else:
-                    pc += 1
-            case Instruction.JMP.name:
-                pc += _object[pc]
-            case Instruction.HALT.name:
-                break
+        if op == IFETCH:
+            stack[sp] = tos
+            sp += 1
+            tos = gvars[arg]
+        elif op == ISTORE:
+            gvars[arg] = tos
+        elif op == ISTORE_POP:
+            gvars[arg] = tos
+            sp -= 1
+            tos = stack[sp]
+        elif op == IPUSH:
+            stack[sp] = tos
+            sp += 1
+            tos = arg
+        elif op == IFETCH_ADD:
+            tos = ((tos + gvars[arg] + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        elif op == IFETCH_SUB:
+            tos = ((tos - gvars[arg] + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        elif op == IFETCH_LT:
+            tos = int(tos < gvars[arg])
+        elif op == IPUSH_ADD:
+            tos = ((tos + arg + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        elif op == IPUSH_SUB:
+            tos = ((tos - arg + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        elif op == IPUSH_LT:
+            tos = int(tos < arg)
+        elif op == IPOP:
+            sp -= 1
+            tos = stack[sp]
+        elif op == IADD:
+            sp -= 1
+            tos = ((stack[sp] + tos + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        elif op == ISUB:
+            sp -= 1
+            tos = ((stack[sp] - tos + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        elif op == ILT:
+            sp -= 1
+            tos = int(stack[sp] < tos)
+        elif op == JZ: # Jump offsets are relative to the jump instruction itself.
+            cond = tos
+            sp -= 1
+            tos = stack[sp]
+            if cond == 0:
+                pc += arg - 1
+        elif op == JNZ:
+            cond = tos
+            sp -= 1
+            tos = stack[sp]
+            if cond != 0:
+                pc += arg - 1
+        elif op == JMP:
+            pc += arg - 1
+        elif op == IPUSH_WIDE: # The constant is the next word.
+            stack[sp] = tos
+            sp += 1
+            tos = obj[pc]
+            pc += 1
+        else: # HALT
+            break
+
+def run() -> None:
+    _run(_object, _globals, array.array("i", [0] * 1000))
+
+# ---------------------------------------------------------------------------#
+
+# Python backend #
+
+# Instead of interpreting object code, the AST can be translated to Python source and compiled with compile(), so that
+# CPython's own eval loop runs the program. The variables "a" to "z" become locals of the generated function.
+
+VARIABLES: str = ", ".join(chr(ord("a") + i) for i in range(26))
+
+def py_expr(x: int) -> str:
+    k = KIND[x]
+    if k == VAR:
+        return chr(ord("a") + VAL[x])
+    elif k == CST:
+        return str(VAL[x])
+    elif k in (ADD, SUB):
+        # "+" and "-" are left-associative, so a left-nested chain needs no inner parentheses. The result is wrapped to
+        # 32 bits like on the VM (see wrap()); wrapping once at the end of the chain gives the same value as per step.
+        terms = []
+        while KIND[x] in (ADD, SUB):
+            terms.append(f"{'+' if KIND[x] == ADD else '-'} {py_expr(O2[x])}")
+            x = O1[x]
+        return f"(({py_expr(x)} {' '.join(reversed(terms))} + 0x80000000 & 0xFFFFFFFF) - 0x80000000)"
+    elif k == LT:
+        return f"(1 if {py_expr(O1[x])} < {py_expr(O2[x])} else 0)"
+    else: # SET
+        return f"({py_expr(O1[x])} := {py_expr(O2[x])})"
+
+def py_cond(x: int) -> str: # A condition is only tested for truth, so "<" can stay a plain comparison.
+    if KIND[x] == LT:
+        return f"{py_expr(O1[x])} < {py_expr(O2[x])}"
+    return py_expr(x)
+
+def emit_py(x: int, indent: str) -> list[str]:
+    k = KIND[x]
+    inner = indent + "    "
+    if k == IF1:
+        return [f"{indent}if {py_cond(O1[x])}:", *emit_py(O2[x], inner)]
+    elif k == IF2:
+        return [f"{indent}if {py_cond(O1[x])}:", *emit_py(O2[x], inner), f"{indent}else:", *emit_py(O3[x], inner)]
+    elif k == WHILE:
+        return [f"{indent}while {py_cond(O1[x])}:", *emit_py(O2[x], inner)]
+    elif k == DO:
+        return [f"{indent}while True:", *emit_py(O1[x], inner),
+                f"{inner}if not ({py_cond(O2[x])}):", f"{inner}    break"]
+    elif k == EMPTY:
+        return [f"{indent}pass"]
+    elif k == SEQ: # Blocks are left-nested SEQ nodes, walk them without recursing once per statement.
+        statements = []
+        while KIND[x] == SEQ:
+            statements.append(O2[x])
+            x = O1[x]
+        statements.append(x)
+        return [line for s in reversed(statements) for line in emit_py(s, indent)]
+    elif k == EXPR:
+        if KIND[O1[x]] == SET:
+            return [f"{indent}{py_expr(O1[O1[x]])} = {py_expr(O2[O1[x]])}"]
+        return [f"{indent}{py_expr(O1[x])}"]
+    else: # PROG
+        return ["def tinyc():", f"    {VARIABLES.replace(', ', ' = ')} = 0", *emit_py(O1[x], "    "),
+                f"    return {VARIABLES}"]
+
+def compile_py() -> Optional[CodeType]: # None if the program nests deeper than CPython's compiler allows.
+    code = load_cache("py")
+    if not isinstance(code, CodeType):
+        try:
+            code = compile("\n".join(emit_py(program(), "")), "<tinyc>", "exec")
+        except (SyntaxError, RecursionError):
+            return None
+        save_cache("py", code)
+    return code
+
+def run_py(code: CodeType) -> tuple[int, ...]:
+    namespace: dict = {}
+    exec(code, namespace)
+    return namespace["tinyc"]()
 
 # ---------------------------------------------------------------------------#
 
 # Main program. #
 
-if __name__ == "__main__":
-    c(program())
+def execute(vm: bool) -> list[int]: # Compiles and runs source, returns the values of "a" to "z".
+    code = None if vm else compile_py()
+    if code is None: # The VM was asked for, or the Python backend cannot compile the program.
+        compile_vm()
+        for i in range(26):
+            _globals[i] = 0
+        run()
+        return list(_globals)
+    return list(run_py(code))
 
+if __name__ == "__main__":
+    source = sys.stdin.read()
+    use_cache = "--no-cache" not in sys.argv[1:]
+    values = execute("--vm" in sys.argv[1:])
     for i in range(26):
-        _globals[i] = 0
-    run()
-    for i in range(26):
-        if _globals[i] != 0:
-            print(f"{(ord('a') + i)} = {_globals[i]}")
+        if values[i] != 0:
+            print(f"{(ord('a') + i)} = {values[i]}")
 
     sys.exit(0)